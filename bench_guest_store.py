@@ -0,0 +1,108 @@
+"""
+Benchmark: memory per guest and lookup latency of GuestStore (guest_store.py)
+against plain dicts, plus snapshot size and load time.
+Uses synthetic guests; no Luma access needed.
+
+Run: python bench_guest_store.py [guests] (default 100000)
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from guest_store import GuestRecord, GuestStore
+
+_FIRST = ["Anna", "Ben", "Carla", "David", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas", "Karen", "Levon"]
+_LAST = ["Müller", "Smith", "Garcia", "Khachatryan", "Nguyen", "Rossi", "Kowalski", "Dubois", "Sato", "Novak"]
+
+
+def _guests(n: int, companies: int) -> list[tuple[str, str, str]]:
+    rnd = random.Random(42)
+    pool = [f"Company {i} GmbH" for i in range(companies)]
+    return [
+        (f"g-{rnd.getrandbits(48):012x}", f"{rnd.choice(_FIRST)} {rnd.choice(_LAST)} {i}", rnd.choice(pool))
+        for i in range(n)
+    ]
+
+
+def _measure(build: Callable[[], Any]) -> tuple[Any, int]:
+    """Build a structure and return it with the bytes it allocated."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+
+def _lookup_ns(get: Callable[[str], Any], keys: list[str]) -> float:
+    t0 = time.perf_counter()
+    for k in keys:
+        get(k)
+    return (time.perf_counter() - t0) / len(keys) * 1e9
+
+
+def main() -> int:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    guests = _guests(n, companies=max(1, n // 50))
+
+    def fresh() -> list[tuple[str, str, str]]:
+        # New string objects, so every structure pays for its own text like data parsed from Luma.
+        return [(t.encode().decode(), a.encode().decode(), c.encode().decode()) for t, a, c in guests]
+    keys = [g[0] for g in random.Random(7).sample(guests, min(n, 100000))]
+
+    def build_dict_of_dicts() -> dict:
+        return {t: {"ticket_id": t, "attendee_name": a, "attendee_company": c} for t, a, c in fresh()}
+
+    def build_dict_of_tuples() -> dict:
+        return {t: (a, c) for t, a, c in fresh()}
+
+    def build_dict_of_records() -> dict:
+        return {t: GuestRecord(t, a, c) for t, a, c in fresh()}
+
+    def build_store() -> GuestStore:
+        store = GuestStore()
+        for t, a, c in fresh():
+            store.add(t, a, c)
+        return store
+
+    print(f"{n} guests, {max(1, n // 50)} distinct companies")
+    print(f"{'structure':<28} {'bytes/guest':>12} {'lookup ns':>10}")
+    results = {}
+    for label, build in (
+        ("dict of dicts", build_dict_of_dicts),
+        ("dict of tuples", build_dict_of_tuples),
+        ("dict of __slots__ records", build_dict_of_records),
+        ("GuestStore (in memory)", build_store),
+    ):
+        # The fresh() input list is garbage once build() returns; only the result stays allocated.
+        obj, size = _measure(build)
+        results[label] = obj
+        print(f"{label:<28} {size / n:>12.1f} {_lookup_ns(obj.get, keys):>10.0f}")
+
+    store = results["GuestStore (in memory)"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "roster.gst")
+        t0 = time.perf_counter()
+        store.save(path)
+        save_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        loaded = GuestStore.load(path)
+        load_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        loaded.get(keys[0])
+        first_us = (time.perf_counter() - t0) * 1e6
+        size = os.path.getsize(path)
+        print(f"{'GuestStore (mmap snapshot)':<28} {size / n:>12.1f} {_lookup_ns(loaded.get, keys):>10.0f}"
+              "   (bytes/guest = file size)")
+        print(f"Snapshot: {size / 1e6:.1f} MB, save {save_ms:.0f} ms, load {load_ms:.2f} ms, first lookup {first_us:.0f} us")
+        loaded.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+Command-line analytics for the check-in audit log (see checkin_logger.py).
+Streams checkins.csv row by row, so multi-day logs with millions of rows can be
+analysed without loading them into memory or a spreadsheet.
+
+Reports arrivals per minute, per-Ranger throughput, print_status breakdown,
+duplicate scans and the busiest time windows.
+
+Run:
+  python checkin_stats.py checkins.csv
+  python checkin_stats.py checkins.csv --json
+  python checkin_stats.py checkins.csv --json --per-minute   # include the full arrivals series
+  python checkin_stats.py checkins.csv --follow --interval 10
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, TextIO
+
+# Column order written by checkin_logger.log_checkin.
+LOG_COLUMNS = ["timestamp_utc", "ranger_id", "ticket_id", "print_status", "attendee_name", "attendee_company"]
+
+MINUTE_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Distinct error messages counted separately; the least frequent ones are folded into "(other)".
+MAX_ERROR_MESSAGES = 50
+OTHER_ERRORS = "(other)"
+
+# Parts of error messages that differ per scan, replaced so the same problem counts as one message.
+_ERROR_MASKS = [
+    (re.compile(r"^(Error: Already checked in at)\b.*"), r"\1 <station>"),
+    (re.compile(r"https?://\S+|\burl: \S+"), "<url>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ][\d:.]+Z?"), "<time>"),
+    (re.compile(r"\b(?:g|gst|evt|cal|usr)-[A-Za-z0-9]+"), "<id>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<addr>"),
+    (re.compile(r"\b\d{5,}\b"), "<n>"),
+]
+
+
+def _status_category(print_status: str) -> str:
+    """Group a print_status value into a small fixed set of categories."""
+    s = (print_status or "").strip()
+    if s.startswith("Success"):
+        return "Success (Luma check-in failed)" if "Luma check-in failed" in s else "Success"
+    if s.startswith("Error"):
+        return "Error"
+    return s or "(empty)"
+
+
+def _strip_trailing_parens(s: str) -> str:
+    """Drop a trailing "(...)" group (balanced, may be nested), e.g. "(Caused by ...)"."""
+    while s.endswith(")"):
+        depth = 0
+        for i in range(len(s) - 1, -1, -1):
+            if s[i] == ")":
+                depth += 1
+            elif s[i] == "(":
+                depth -= 1
+                if depth == 0:
+                    break
+        if depth != 0 or i == 0:
+            return s
+        s = s[:i].rstrip()
+    return s
+
+
+def _error_key(print_status: str) -> str:
+    """
+    Stable grouping key for an error print_status: per-scan details (trailing
+    parentheticals, URLs, ticket IDs, timestamps, station names) are removed.
+    """
+    s = _strip_trailing_parens((print_status or "").strip())
+    for pattern, repl in _ERROR_MASKS:
+        s = pattern.sub(repl, s)
+    return s or "(empty)"
+
+
+def _ticket_digest(ticket_id: str) -> bytes:
+    """Fixed-size key for the seen-ticket set, so long ticket strings are not kept."""
+    return hashlib.blake2b(ticket_id.strip().encode("utf-8"), digest_size=8).digest()
+
+
+class CheckinStats:
+    """
+    Running aggregates over audit log rows.
+    Memory grows with distinct minutes, Rangers and tickets, never with row count.
+    """
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.bad_rows = 0
+        self.first_ts = ""
+        self.last_ts = ""
+        self.per_minute: Counter = Counter()
+        self.per_ranger: Counter = Counter()
+        self.per_ranger_ok: Counter = Counter()
+        self.ranger_minutes: dict[str, Counter] = {}
+        self.status_categories: Counter = Counter()
+        self.error_messages: Counter = Counter()
+        self.duplicate_scans = 0
+        self.duplicate_tickets = 0
+        self._seen: set[bytes] = set()
+        self._seen_twice: set[bytes] = set()
+        self._last_minute = ""
+
+    def add_row(self, row: list[str]) -> None:
+        """Fold one CSV row (LOG_COLUMNS order) into the aggregates."""
+        if len(row) < 4 or row[0] == LOG_COLUMNS[0]:
+            if row and row[0] != LOG_COLUMNS[0]:
+                self.bad_rows += 1
+            return
+        ts, ranger_id, ticket_id, print_status = row[0], row[1], row[2], row[3]
+        # ISO timestamps: the first 16 chars are "YYYY-MM-DDTHH:MM".
+        minute = ts[:16]
+        if minute != self._last_minute:
+            # Rows arrive in time order, so this parses roughly once per minute, not per row.
+            try:
+                datetime.strptime(minute, MINUTE_FORMAT)
+            except ValueError:
+                self.bad_rows += 1
+                return
+            self._last_minute = minute
+        self.rows += 1
+        if not self.first_ts:
+            self.first_ts = ts
+        self.last_ts = ts
+        self.per_minute[minute] += 1
+        ranger = ranger_id or "(unknown)"
+        self.per_ranger[ranger] += 1
+        minutes = self.ranger_minutes.get(ranger)
+        if minutes is None:
+            minutes = self.ranger_minutes[ranger] = Counter()
+        minutes[minute] += 1
+
+        category = _status_category(print_status)
+        self.status_categories[category] += 1
+        if category.startswith("Success"):
+            self.per_ranger_ok[ranger] += 1
+        else:
+            self._count_error(_error_key(print_status))
+
+        key = _ticket_digest(ticket_id)
+        if key in self._seen:
+            self.duplicate_scans += 1
+            if key not in self._seen_twice:
+                self._seen_twice.add(key)
+                self.duplicate_tickets += 1
+        else:
+            self._seen.add(key)
+
+    def _count_error(self, msg: str) -> None:
+        errors = self.error_messages
+        if msg not in errors:
+            distinct = len(errors) - (OTHER_ERRORS in errors)
+            if distinct >= MAX_ERROR_MESSAGES:
+                # Full: fold the least frequent message (oldest on ties) into "(other)".
+                evict = min((m for m in errors if m != OTHER_ERRORS), key=errors.__getitem__)
+                errors[OTHER_ERRORS] += errors.pop(evict)
+        errors[msg] += 1
+
+    def minute_series(self) -> list[tuple[str, int]]:
+        """Arrivals per minute from the first to the last scan, as (minute, scans); gaps are zero."""
+        if not self.per_minute:
+            return []
+        minutes = sorted(self.per_minute)
+        start = datetime.strptime(minutes[0], MINUTE_FORMAT)
+        end = datetime.strptime(minutes[-1], MINUTE_FORMAT)
+        step = timedelta(minutes=1)
+        counts: list[tuple[str, int]] = []
+        t = start
+        while t <= end:
+            key = t.strftime(MINUTE_FORMAT)
+            counts.append((key, self.per_minute.get(key, 0)))
+            t += step
+        return counts
+
+    def peak_windows(self, window_minutes: int, top: int) -> list[tuple[str, int]]:
+        """
+        Busiest non-overlapping windows of window_minutes, as (start_minute, scans).
+        Minutes without scans count as zero.
+        """
+        counts = self.minute_series()
+        if not counts:
+            return []
+        window = max(1, window_minutes)
+        sums: list[tuple[int, int]] = []
+        running = 0
+        for i, (_, c) in enumerate(counts):
+            running += c
+            if i >= window:
+                running -= counts[i - window][1]
+            if i >= window - 1 or i == len(counts) - 1:
+                sums.append((running, max(0, i - window + 1)))
+        result: list[tuple[str, int]] = []
+        taken: list[int] = []
+        for total, idx in sorted(sums, key=lambda x: (-x[0], x[1])):
+            if len(result) >= top or total == 0:
+                break
+            if any(abs(idx - t) < window for t in taken):
+                continue
+            taken.append(idx)
+            result.append((counts[idx][0], total))
+        return result
+
+    def report(self, window_minutes: int = 5, top: int = 5, per_minute: bool = False) -> dict:
+        """
+        Summary as a plain dict (also used for --json output).
+        per_minute adds the full arrivals-per-minute series (one entry per minute).
+        """
+        busiest_minutes = sorted(self.per_minute.items(), key=lambda x: (-x[1], x[0]))[:top]
+        rangers = {}
+        for ranger, total in self.per_ranger.most_common():
+            ok = self.per_ranger_ok.get(ranger, 0)
+            minutes = self.ranger_minutes.get(ranger) or Counter()
+            rangers[ranger] = {
+                "scans": total,
+                "success": ok,
+                "error_rate": round(1 - ok / total, 4) if total else 0.0,
+                "active_minutes": len(minutes),
+                "per_active_minute": round(total / len(minutes), 2) if minutes else 0.0,
+                "peak_per_minute": max(minutes.values(), default=0),
+            }
+        errors = sum(c for cat, c in self.status_categories.items() if not cat.startswith("Success"))
+        r = {
+            "rows": self.rows,
+            "bad_rows": self.bad_rows,
+            "first_timestamp": self.first_ts,
+            "last_timestamp": self.last_ts,
+            "active_minutes": len(self.per_minute),
+            "avg_per_active_minute": round(self.rows / len(self.per_minute), 2) if self.per_minute else 0.0,
+            "busiest_minutes": [{"minute": m, "scans": c} for m, c in busiest_minutes],
+            "peak_windows": [
+                {"start": m, "minutes": window_minutes, "scans": c}
+                for m, c in self.peak_windows(window_minutes, top)
+            ],
+            "rangers": rangers,
+            "status": dict(self.status_categories.most_common()),
+            "error_rate": round(errors / self.rows, 4) if self.rows else 0.0,
+            "top_errors": dict(self.error_messages.most_common(top)),
+            "unique_tickets": len(self._seen),
+            "duplicate_scans": self.duplicate_scans,
+            "duplicate_tickets": self.duplicate_tickets,
+        }
+        if per_minute:
+            r["per_minute"] = [{"minute": m, "scans": c} for m, c in self.minute_series()]
+        return r
+
+
+def iter_rows(f: TextIO) -> Iterator[list[str]]:
+    """Yield parsed CSV rows from an open log file without reading it all at once."""
+    for row in csv.reader(f):
+        if row:
+            yield row
+
+
+def follow_rows(f: TextIO, poll_seconds: float = 0.5) -> Iterator[Optional[list[str]]]:
+    """
+    Tail a log file that is still being written. Yields rows as they are appended,
+    and None whenever no new data arrived for poll_seconds (so callers can report).
+    Incomplete last lines are held back until the writer finishes them.
+    """
+    pending = ""
+    while True:
+        line = f.readline()
+        if not line:
+            yield None
+            time.sleep(poll_seconds)
+            continue
+        pending += line
+        if not pending.endswith("\n"):
+            continue
+        for row in csv.reader([pending]):
+            if row:
+                yield row
+        pending = ""
+
+
+def format_report(r: dict) -> str:
+    """Human-readable report text."""
+    lines = [
+        f"Rows: {r['rows']}  (unparseable: {r['bad_rows']})",
+        f"Span: {r['first_timestamp'] or '—'} .. {r['last_timestamp'] or '—'}",
+        f"Active minutes: {r['active_minutes']}  avg arrivals/active minute: {r['avg_per_active_minute']}",
+        f"Unique tickets: {r['unique_tickets']}  duplicate scans: {r['duplicate_scans']}"
+        f"  (tickets scanned more than once: {r['duplicate_tickets']})",
+        f"Error rate: {r['error_rate'] * 100:.2f}%",
+        "",
+        "Print status:",
+    ]
+    for status, c in r["status"].items():
+        lines.append(f"  {c:>9}  {status}")
+    if r["top_errors"]:
+        lines.append("")
+        lines.append("Top errors:")
+        for msg, c in r["top_errors"].items():
+            lines.append(f"  {c:>9}  {msg}")
+    lines.append("")
+    lines.append("Rangers (scans / success / error rate / scans per active minute / peak per minute):")
+    for ranger, s in r["rangers"].items():
+        lines.append(
+            f"  {ranger:<20} {s['scans']:>9} {s['success']:>9} {s['error_rate'] * 100:>7.2f}%"
+            f" {s['per_active_minute']:>8} {s['peak_per_minute']:>6}"
+        )
+    lines.append("")
+    lines.append("Busiest minutes:")
+    for m in r["busiest_minutes"]:
+        lines.append(f"  {m['minute']}  {m['scans']}")
+    lines.append("")
+    lines.append("Peak windows:")
+    for w in r["peak_windows"]:
+        lines.append(f"  {w['start']} (+{w['minutes']} min)  {w['scans']}")
+    if "per_minute" in r:
+        lines.append("")
+        lines.append("Arrivals per minute:")
+        for m in r["per_minute"]:
+            lines.append(f"  {m['minute']}  {m['scans']}")
+    return "\n".join(lines)
+
+
+def _emit(stats: CheckinStats, args: argparse.Namespace) -> None:
+    r = stats.report(window_minutes=args.window, top=args.top, per_minute=args.per_minute)
+    if args.json:
+        print(json.dumps(r, ensure_ascii=False))
+    else:
+        print(format_report(r))
+        print()
+    sys.stdout.flush()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyse a check-in audit log (checkins.csv).")
+    parser.add_argument("log_path", nargs="?", default="checkins.csv", help="Path to the audit log CSV.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    parser.add_argument("--window", type=int, default=5, help="Peak-load window size in minutes (default 5).")
+    parser.add_argument("--top", type=int, default=5, help="Number of entries in top-N lists (default 5).")
+    parser.add_argument("--per-minute", action="store_true", help="Include the full arrivals-per-minute series.")
+    parser.add_argument("--follow", action="store_true", help="Keep reading as the file grows and report periodically.")
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between reports with --follow (default 10).")
+    args = parser.parse_args(argv)
+
+    stats = CheckinStats()
+    try:
+        f = open(args.log_path, "r", newline="", encoding="utf-8", errors="replace")
+    except OSError as e:
+        print(f"Error: cannot open {args.log_path}: {e}", file=sys.stderr)
+        return 1
+    with f:
+        if not args.follow:
+            for row in iter_rows(f):
+                stats.add_row(row)
+            _emit(stats, args)
+            return 0
+        last_report = 0.0
+        reported_rows = 0
+        caught_up = False
+        try:
+            for row in follow_rows(f):
+                if row is not None:
+                    stats.add_row(row)
+                elif not caught_up:
+                    # Existing contents read: report them once, then every interval.
+                    caught_up = True
+                    last_report = 0.0
+                    reported_rows = -1
+                if not caught_up:
+                    continue
+                now = time.monotonic()
+                if now - last_report >= args.interval and stats.rows != reported_rows:
+                    _emit(stats, args)
+                    last_report = now
+                    reported_rows = stats.rows
+        except KeyboardInterrupt:
+            _emit(stats, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,7 +14,10 @@ DEFAULTS = {
         "base_url": "https://public-api.luma.com/v1/event",
         "api_key": "",
         "check_in_on_scan": True,
+        "pipelined": False,
         "event_id": "",
+        "reject_cache_ttl_s": 600,
+        "roster_snapshot": "",
     },
     "printer": {
         "name": "",
@@ -23,6 +26,21 @@ DEFAULTS = {
     "logging": {
         "checkin_log_path": "checkins.csv",
     },
+    "recording": {
+        "scan_trace_path": "",
+    },
+    "debug": {
+        "enabled": False,
+        "admin_token": "",
+        "trace_buffer_size": 500,
+    },
+    "cluster": {
+        "enabled": False,
+        "station_id": "",
+        "peers": [],
+        "token": "",
+        "pull_interval_s": 2.0,
+    },
 }
 
 
@@ -40,7 +58,7 @@ def _deep_merge(base: dict, override: dict) -> dict:
 def load_config(config_path: str | None = None) -> dict:
     """
     Load config from YAML file. Falls back to DEFAULTS if file missing.
-    Returns a single dict with listen_port, luma, printer, logging.
+    Returns a single dict with listen_port, luma, printer, logging, recording, debug, cluster.
     """
     if config_path is None:
         base = Path(__file__).resolve().parent
@@ -74,3 +92,15 @@ def get_printer_settings(config: dict) -> dict:
 
 def get_log_settings(config: dict) -> dict:
     return config.get("logging", DEFAULTS["logging"])
+
+
+def get_recording_settings(config: dict) -> dict:
+    return config.get("recording", DEFAULTS["recording"])
+
+
+def get_debug_settings(config: dict) -> dict:
+    return config.get("debug", DEFAULTS["debug"])
+
+
+def get_cluster_settings(config: dict) -> dict:
+    return config.get("cluster", DEFAULTS["cluster"])
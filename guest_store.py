@@ -0,0 +1,374 @@
+"""
+Compact guest roster for large events (100k+ guests).
+
+GuestStore keeps guests column-wise instead of one dict/tuple per guest:
+  - ticket IDs and names as UTF-8 in one shared byte blob, addressed by offsets;
+  - company names interned (each distinct company stored once, rows hold an index);
+  - an open-addressing hash index of 64-bit ticket-key hashes in flat arrays.
+That is roughly 30-40 bytes per guest plus the text itself, instead of several
+hundred for a dict of tuples.
+
+A store can be saved as a binary snapshot and loaded again with mmap: loading only
+maps the file and reads a small header, so it takes milliseconds regardless of size.
+Lookups return GuestRecord objects (__slots__, no per-instance dict).
+
+Run:
+  python guest_store.py build guests.csv roster.gst     # from a Luma guest CSV export
+  python guest_store.py info roster.gst
+  python guest_store.py lookup roster.gst g-abc123
+"""
+
+import csv
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Iterator, Optional
+
+from luma_client import _normalize_guest
+from ticket_parser import parse_ticket_id
+
+_MAGIC = b"GSTORE02"
+# magic, byte order flag, rows, distinct guests, companies, index slots,
+# string blob bytes, company blob bytes
+_HEADER = struct.Struct("<8sIIIIIQQ")
+_BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+_EMPTY = 0  # index slots hold row + 1; 0 means free
+
+# Columns indexed as ticket IDs when building from a CSV export.
+_CSV_TICKET_COLUMNS = ("guest_key", "ticket_key", "pk", "api_id", "id", "qr_code_url")
+
+
+def ticket_hash(key: bytes) -> int:
+    """
+    Stable 64-bit hash of a UTF-8 ticket ID (Python's hash() changes between runs).
+    Cheap rather than strong: lookups always confirm a hash match against the stored ID.
+    """
+    return zlib.crc32(key) | (zlib.adler32(key) << 32)
+
+
+class GuestRecord:
+    """One guest as returned by GuestStore lookups."""
+
+    __slots__ = ("ticket_id", "attendee_name", "attendee_company")
+
+    def __init__(self, ticket_id: str, attendee_name: str, attendee_company: str):
+        self.ticket_id = ticket_id
+        self.attendee_name = attendee_name
+        self.attendee_company = attendee_company
+
+    def __repr__(self) -> str:
+        return f"GuestRecord({self.ticket_id!r}, {self.attendee_name!r}, {self.attendee_company!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GuestRecord):
+            return NotImplemented
+        return (self.ticket_id, self.attendee_name, self.attendee_company) == (
+            other.ticket_id, other.attendee_name, other.attendee_company
+        )
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class GuestStore:
+    """
+    Column-oriented guest table with a hash index on ticket ID.
+    Not thread-safe; callers that share a store between threads must lock.
+    """
+
+    def __init__(self) -> None:
+        self._keys = array("Q")          # 64-bit ticket hash per row
+        self._company_idx = array("I")   # index into _companies per row
+        self._offsets = array("I", [0])  # row i: ticket = blob[o[2i]:o[2i+1]], name = blob[o[2i+1]:o[2i+2]]
+        self._blob = bytearray()
+        self._companies: list[str] = []
+        self._company_ids: dict[str, int] = {}
+        self._index = array("I", [_EMPTY] * 8)
+        self._count = 0  # distinct tickets; rows can be more after a ticket is re-added
+        self._mmap: Optional[mmap.mmap] = None
+        self._file = None
+
+    # --- lookup ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, ticket_id: str) -> bool:
+        return self._find(ticket_id) >= 0
+
+    def get(self, ticket_id: str) -> Optional[GuestRecord]:
+        row = self._find(ticket_id)
+        if row < 0:
+            return None
+        offsets = self._offsets
+        name = str(self._blob[offsets[2 * row + 1]:offsets[2 * row + 2]], "utf-8")
+        return GuestRecord(ticket_id, name, self._companies[self._company_idx[row]])
+
+    def __iter__(self) -> Iterator[GuestRecord]:
+        """All guests; a ticket added twice is returned once, with its latest data."""
+        for row in range(len(self._keys)):
+            ticket_id = self._text(2 * row)
+            if self._find(ticket_id) == row:
+                yield GuestRecord(ticket_id, self._text(2 * row + 1), self._companies[self._company_idx[row]])
+
+    def _text(self, i: int) -> str:
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def _slot(self, h: int, key: bytes) -> tuple[int, int]:
+        """(slot, row) for hash h of key; row is -1 and slot is the first free one if not found."""
+        index, keys, offsets, blob = self._index, self._keys, self._offsets, self._blob
+        mask = len(index) - 1
+        slot = h & mask
+        while True:
+            entry = index[slot]
+            if entry == _EMPTY:
+                return slot, -1
+            row = entry - 1
+            if keys[row] == h and blob[offsets[2 * row]:offsets[2 * row + 1]] == key:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _find(self, ticket_id: str) -> int:
+        key = ticket_id.encode("utf-8")
+        return self._slot(ticket_hash(key), key)[1]
+
+    # --- building ----------------------------------------------------------------
+
+    def add(self, ticket_id: str, attendee_name: str, attendee_company: str) -> None:
+        """Add a guest, or replace the data of a ticket that is already present."""
+        if self._mmap is not None:
+            self._materialize()
+        key = ticket_id.encode("utf-8")
+        h = ticket_hash(key)
+        slot, existing = self._slot(h, key)
+        company_id = self._company_ids.get(attendee_company)
+        if company_id is None:
+            company_id = len(self._companies)
+            self._companies.append(attendee_company)
+            self._company_ids[attendee_company] = company_id
+        row = len(self._keys)
+        self._keys.append(h)
+        self._company_idx.append(company_id)
+        self._blob += key
+        self._offsets.append(len(self._blob))
+        self._blob += attendee_name.encode("utf-8")
+        self._offsets.append(len(self._blob))
+        self._index[slot] = row + 1
+        if existing < 0:
+            self._count += 1
+            if 2 * len(self._keys) > len(self._index):
+                self._rebuild_index(2 * len(self._index))
+
+    def _rebuild_index(self, size: int) -> None:
+        self._index = array("I", [_EMPTY]) * size
+        # Newest row first, so a ticket added twice points at its latest data.
+        for row in range(len(self._keys) - 1, -1, -1):
+            key = bytes(self._blob[self._offsets[2 * row]:self._offsets[2 * row + 1]])
+            slot, existing = self._slot(self._keys[row], key)
+            if existing < 0:
+                self._index[slot] = row + 1
+
+    def _materialize(self) -> None:
+        """Copy mmap-backed columns into private arrays so the store can be modified."""
+        columns = {}
+        for name, typecode in (("_keys", "Q"), ("_company_idx", "I"), ("_offsets", "I"), ("_index", "I")):
+            a = array(typecode)
+            a.frombytes(getattr(self, name).tobytes())
+            columns[name] = a
+        blob = bytearray(self._blob)
+        self.close()
+        for name, a in columns.items():
+            setattr(self, name, a)
+        self._blob = blob
+
+    # --- snapshots ---------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """Write a snapshot (atomically: temp file, then rename)."""
+        company_blob = bytearray()
+        company_offsets = array("I", [0])
+        for name in self._companies:
+            company_blob += name.encode("utf-8")
+            company_offsets.append(len(company_blob))
+        sections = [
+            self._keys.tobytes(),
+            self._index.tobytes(),
+            self._company_idx.tobytes(),
+            self._offsets.tobytes(),
+            company_offsets.tobytes(),
+            bytes(company_blob),
+            bytes(self._blob),
+        ]
+        header = _HEADER.pack(
+            _MAGIC, _BYTE_ORDER, len(self._keys), self._count, len(self._companies), len(self._index),
+            len(self._blob), len(company_blob),
+        )
+        tmp = Path(str(path) + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(b"\0" * (_align8(len(header)) - len(header)))
+            for data in sections:
+                f.write(data)
+                f.write(b"\0" * (_align8(len(data)) - len(data)))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _section_sizes(rows: int, n_companies: int, slots: int, blob_len: int, company_blob_len: int) -> list[int]:
+        """Byte sizes of the snapshot sections after the header, in file order."""
+        return [
+            8 * rows,                # _keys
+            4 * slots,               # _index
+            4 * rows,                # _company_idx
+            4 * (2 * rows + 1),      # _offsets
+            4 * (n_companies + 1),   # company offsets
+            company_blob_len,
+            blob_len,
+        ]
+
+    @classmethod
+    def load(cls, path: str) -> "GuestStore":
+        """
+        Open a snapshot via mmap; columns are read straight from the mapped file.
+        Raises ValueError for files that are not a complete snapshot (e.g. truncated).
+        """
+        f = open(path, "rb")
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise ValueError(f"{path}: empty file, not a guest snapshot")
+        views: list[memoryview] = []
+        try:
+            if len(mm) < _HEADER.size:
+                raise ValueError(f"{path}: not a guest snapshot (file too short)")
+            magic, order, rows, count, n_companies, slots, blob_len, company_blob_len = _HEADER.unpack_from(mm, 0)
+            if magic != _MAGIC:
+                raise ValueError(f"{path}: not a guest snapshot")
+            if order != _BYTE_ORDER:
+                raise ValueError(f"{path}: snapshot was written on a machine with different byte order")
+            # The index must be a power of two with free slots left, or lookups never end.
+            if slots == 0 or slots & (slots - 1) or count > rows or count >= slots:
+                raise ValueError(f"{path}: corrupt guest snapshot header")
+            sizes = cls._section_sizes(rows, n_companies, slots, blob_len, company_blob_len)
+            expected = _align8(_HEADER.size) + sum(_align8(n) for n in sizes)
+            if len(mm) != expected:
+                raise ValueError(
+                    f"{path}: incomplete or corrupt guest snapshot ({len(mm)} bytes, expected {expected})"
+                )
+            view = memoryview(mm)
+            views.append(view)
+            pos = _align8(_HEADER.size)
+
+            def take(nbytes: int) -> memoryview:
+                nonlocal pos
+                part = view[pos:pos + nbytes]
+                views.append(part)
+                pos += _align8(nbytes)
+                return part
+
+            store = cls()
+            store._count = count
+            keys, index, company_idx, offsets, company_offsets, company_blob, blob = (take(n) for n in sizes)
+            store._keys = keys.cast("Q")
+            store._index = index.cast("I")
+            store._company_idx = company_idx.cast("I")
+            store._offsets = offsets.cast("I")
+            company_offsets = company_offsets.cast("I")
+            store._blob = blob
+            views += [store._keys, store._index, store._company_idx, store._offsets, company_offsets]
+            if store._offsets[-1] != blob_len or company_offsets[-1] != company_blob_len:
+                raise ValueError(f"{path}: corrupt guest snapshot")
+            store._companies = [
+                str(company_blob[company_offsets[i]:company_offsets[i + 1]], "utf-8")
+                for i in range(n_companies)
+            ]
+            company_offsets.release()
+            company_blob.release()
+            store._company_ids = {name: i for i, name in enumerate(store._companies)}
+            store._mmap = mm
+            store._file = f
+            return store
+        except Exception:
+            # The mmap cannot be closed while any view of it is still exported.
+            for v in reversed(views):
+                v.release()
+            mm.close()
+            f.close()
+            raise
+
+    def close(self) -> None:
+        """Release the mapped snapshot file (after _materialize, or when done)."""
+        if self._mmap is not None:
+            for name in ("_keys", "_index", "_company_idx", "_offsets", "_blob"):
+                value = getattr(self, name)
+                if isinstance(value, memoryview):
+                    value.release()
+                    setattr(self, name, array("I") if name != "_blob" else bytearray())
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- import ------------------------------------------------------------------
+
+    @classmethod
+    def from_csv(cls, path: str) -> "GuestStore":
+        """
+        Build a store from a Luma guest CSV export. Every ID a guest can be scanned by
+        is indexed: each present column of guest_key, ticket_key, pk, api_id, id and
+        qr_code_url that parses as a ticket ID. Name and company are normalised the
+        same way as get-guest responses.
+        """
+        store = cls()
+        with open(path, "r", newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            columns = {c.strip().lower(): c for c in (reader.fieldnames or [])}
+            ticket_cols = [columns[c] for c in _CSV_TICKET_COLUMNS if c in columns]
+            if not ticket_cols:
+                raise ValueError(f"{path}: no ticket column (expected one of {', '.join(_CSV_TICKET_COLUMNS)})")
+            for row in reader:
+                data = {k.strip().lower(): (v or "") for k, v in row.items() if k}
+                ticket_ids = []
+                for col in ticket_cols:
+                    ticket_id, _ = parse_ticket_id(row.get(col) or "")
+                    if ticket_id and ticket_id not in ticket_ids:
+                        ticket_ids.append(ticket_id)
+                if not ticket_ids:
+                    continue
+                name, company = _normalize_guest(data)
+                for ticket_id in ticket_ids:
+                    store.add(ticket_id, name, company)
+        return store
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) == 3 and args[0] == "build":
+        store = GuestStore.from_csv(args[1])
+        store.save(args[2])
+        print(f"Wrote {len(store)} ticket IDs, {len(store._companies)} companies to {args[2]}")
+        return 0
+    if len(args) == 2 and args[0] == "info":
+        store = GuestStore.load(args[1])
+        size = os.path.getsize(args[1])
+        print(f"{len(store)} ticket IDs, {len(store._companies)} companies, {size} bytes "
+              f"({size / max(1, len(store)):.1f} bytes/ID)")
+        store.close()
+        return 0
+    if len(args) == 3 and args[0] == "lookup":
+        store = GuestStore.load(args[1])
+        print(store.get(args[2]) or "Not found")
+        store.close()
+        return 0
+    print("Usage:" + __doc__.split("Run:", 1)[1].rstrip(), file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
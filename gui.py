@@ -83,7 +83,10 @@ class CheckInGUI:
             messagebox.showwarning("Check in", "Enter a ticket ID (e.g. guest key or ticket key from Luma).")
             return
         if self.on_manual_checkin:
-            self.on_manual_checkin(ticket_id)
+            try:
+                self.on_manual_checkin(ticket_id)
+            except ValueError as e:
+                messagebox.showwarning("Check in", str(e))
 
     def _do_retry(self) -> None:
         if self.on_retry_print and self._last_result:
@@ -24,6 +24,11 @@ def _normalize_guest(data: dict) -> tuple[str, str]:
     return name, company
 
 
+# get-guest HTTP statuses that mean the ticket itself is unknown or malformed
+# (as opposed to auth, rate-limit or server trouble); safe to remember as invalid.
+NOT_FOUND_STATUSES = (400, 404, 422)
+
+
 def fetch_guest_by_ticket_id(
     ticket_id: str,
     base_url: str,
@@ -41,6 +46,21 @@ def fetch_guest_by_ticket_id(
         (success, attendee_name, attendee_company, error_message).
         On success: error_message is None. On failure: name/company may be empty, error_message set.
     """
+    ok, name, company, error_msg, _ = fetch_guest_with_status(ticket_id, base_url, api_key, event_id)
+    return ok, name, company, error_msg
+
+
+def fetch_guest_with_status(
+    ticket_id: str,
+    base_url: str,
+    api_key: str,
+    event_id: str | None = None,
+) -> tuple[bool, str, str, str | None, int | None]:
+    """
+    Same as fetch_guest_by_ticket_id, plus the HTTP status code as the last element
+    (None if the request never got a response). Compare with NOT_FOUND_STATUSES to
+    tell an unknown ticket from a network or server problem.
+    """
     url = f"{base_url.rstrip('/')}/get-guest"
     params: dict[str, str] = {"id": ticket_id.strip()}
     if event_id:
@@ -52,23 +72,23 @@ def fetch_guest_by_ticket_id(
     try:
         r = requests.get(url, params=params, headers=headers, timeout=15)
     except requests.RequestException as e:
-        return False, "", "", str(e)
+        return False, "", "", str(e), None
     if r.status_code != 200:
         try:
             body = r.json()
             msg = body.get("message") or body.get("error") or r.text
         except Exception:
             msg = r.text or f"HTTP {r.status_code}"
-        return False, "", "", msg
+        return False, "", "", msg, r.status_code
     try:
         data = r.json()
     except Exception as e:
-        return False, "", "", f"Invalid JSON: {e}"
+        return False, "", "", f"Invalid JSON: {e}", r.status_code
     # Consider valid if we got a 200 and something that looks like a guest (e.g. has name or email).
     name, company = _normalize_guest(data)
     if not name and not data.get("email"):
-        return False, name or "—", company, "Guest data missing or invalid"
-    return True, name, company, None
+        return False, name or "—", company, "Guest data missing or invalid", r.status_code
+    return True, name, company, None, r.status_code
 
 
 def check_in_guest(
@@ -76,10 +96,12 @@ def check_in_guest(
     base_url: str,
     api_key: str,
     event_id: str | None = None,
+    checked_in: bool = True,
 ) -> str | None:
     """
     Check in the guest in Luma using update-guest-status (POST).
     ticket_id: same pk value used for get-guest (guest key or ticket key).
+    checked_in: False undoes a check-in (used to roll back a speculative one).
     Returns None on success, or an error message string on failure.
     """
     url = f"{base_url.rstrip('/')}/update-guest-status"
@@ -88,7 +110,7 @@ def check_in_guest(
         "Accept": "application/json",
         "Content-Type": "application/json",
     }
-    body: dict[str, str | bool] = {"id": ticket_id.strip(), "checked_in": True}
+    body: dict[str, str | bool] = {"id": ticket_id.strip(), "checked_in": checked_in}
     if event_id:
         body["event_id"] = event_id
     try:
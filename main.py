@@ -4,27 +4,105 @@ Main entry point: starts HTTP server for Ranger 2 scans, processes each scan
 Each scan is processed one at a time so data from different Rangers is never merged.
 """
 
+import argparse
 import queue
 import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
 
-from config import load_config, get_listen_port, get_luma_settings, get_printer_settings, get_log_settings
-from luma_client import fetch_guest_by_ticket_id, check_in_guest
+from config import (
+    load_config,
+    get_listen_port,
+    get_luma_settings,
+    get_printer_settings,
+    get_log_settings,
+    get_recording_settings,
+    get_debug_settings,
+    get_cluster_settings,
+)
+from luma_client import fetch_guest_with_status, check_in_guest, NOT_FOUND_STATUSES
 from printer_service import print_receipt
 from checkin_logger import log_checkin
 from scan_server import create_scan_server
+from scan_recorder import create_recorder
+from tracing import ScanTrace, TraceBuffer, span
+from profiler import Profiler
+from station_sync import StationSync, create_station_sync
+from ticket_parser import RejectCache, validate_ticket_id
+from guest_store import GuestStore
 from gui import CheckInGUI
 
 
+# Runs the speculative check-in POST next to the get-guest lookup (luma.pipelined).
+_luma_pool: Optional[ThreadPoolExecutor] = None
+_luma_pool_lock = threading.Lock()
+
+
+def _get_luma_pool() -> ThreadPoolExecutor:
+    global _luma_pool
+    with _luma_pool_lock:
+        if _luma_pool is None:
+            _luma_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="luma")
+        return _luma_pool
+
+
+def _traced_check_in(trace: Optional[ScanTrace], *args) -> Optional[str]:
+    with span(trace, "luma_checkin"):
+        return check_in_guest(*args)
+
+
+def _settle_speculative_checkin(
+    checkin_future: Future,
+    status_code: Optional[int],
+    ticket_id: str,
+    base_url: str,
+    api_key: str,
+    event_id: Optional[str],
+    trace: Optional[ScanTrace],
+) -> str:
+    """
+    The lookup failed after a speculative check-in was sent. Roll the check-in back if
+    Luma says the ticket is invalid; otherwise (network/server trouble) leave it and
+    flag it. Returns text to append to the print status ("" if the check-in failed too).
+    """
+    if checkin_future.result() is not None:
+        return ""
+    if status_code in NOT_FOUND_STATUSES:
+        with span(trace, "luma_checkin_rollback"):
+            undo_err = check_in_guest(ticket_id, base_url, api_key, event_id, checked_in=False)
+        if undo_err:
+            return f" (speculative Luma check-in NOT rolled back: {undo_err})"
+        return " (speculative Luma check-in rolled back)"
+    return " (guest was checked in with Luma; lookup failed, sticker not printed)"
+
+
 def process_one_scan(
     ranger_id: str,
     ticket_id: str,
     config: dict,
     gui: Optional[CheckInGUI],
+    trace: Optional[ScanTrace] = None,
+    sync: Optional[StationSync] = None,
+    rejects: Optional[RejectCache] = None,
+    roster: Optional[GuestStore] = None,
 ) -> None:
     """
     For a single scan: fetch guest from Luma, validate, print receipt, log.
     Updates GUI with result. No data from other scans is used.
+    trace: optional; each step is recorded as a span and the final status set on it.
+    sync: optional (cluster mode); tickets already checked in at any station are
+    rejected without calling Luma, and new check-ins are replicated to the peers;
+    the claim is withdrawn again if the sticker does not print. Guests any station
+    has looked up are answered from the replicated guest cache instead of Luma.
+    rejects: optional; tickets Luma reports as unknown are added so repeats are
+    rejected before they reach the queue (see ticket_parser.validate_ticket_id).
+    With luma.pipelined, the check-in POST is sent at the same time as the lookup
+    and printing starts as soon as the guest data is back; a check-in for a ticket
+    the lookup rejects is rolled back (or flagged if that is not possible).
+    roster: optional guest snapshot (luma.roster_snapshot); guests found in it skip
+    the get-guest call.
     """
     luma = get_luma_settings(config)
     printer = get_printer_settings(config)
@@ -36,59 +114,159 @@ def process_one_scan(
     use_raw = bool(printer.get("use_raw", True))
     log_path = (log_cfg.get("checkin_log_path") or "checkins.csv").strip()
 
-    # 1) Fetch attendee from Luma
-    ok, attendee_name, attendee_company, error_msg = fetch_guest_by_ticket_id(
-        ticket_id, base_url, api_key, event_id
-    )
+    # 0) Cluster mode: answer duplicates from the replicated check-in set
+    if sync:
+        prior = sync.checked_in(ticket_id)
+        if prior:
+            _report_duplicate(prior, ranger_id, ticket_id, log_path, gui, trace)
+            return
+
+    check_in_on_scan = bool(luma.get("check_in_on_scan", True))
+    checkin_future: Optional[Future] = None
+    if check_in_on_scan and luma.get("pipelined", False):
+        checkin_future = _get_luma_pool().submit(
+            _traced_check_in, trace, ticket_id, base_url, api_key, event_id
+        )
+
+    # 1) Fetch attendee: from the roster snapshot or the cluster's guest cache if one
+    # has the guest, else from Luma
+    known: Optional[tuple[str, str]] = None
+    if roster is not None:
+        with span(trace, "roster_lookup"):
+            guest = roster.get(ticket_id)
+        if guest:
+            known = (guest.attendee_name, guest.attendee_company)
+    if known is None and sync:
+        with span(trace, "cluster_guest_lookup"):
+            known = sync.guest(ticket_id)
+    if known:
+        ok, attendee_name, attendee_company, error_msg, status_code = True, known[0], known[1], None, None
+    else:
+        with span(trace, "luma_fetch"):
+            ok, attendee_name, attendee_company, error_msg, status_code = fetch_guest_with_status(
+                ticket_id, base_url, api_key, event_id
+            )
+        if ok and sync:
+            # Share the lookup, so other stations do not ask Luma for this guest again.
+            sync.remember_guest(ticket_id, attendee_name, attendee_company)
 
     if not ok:
+        if rejects is not None and status_code in NOT_FOUND_STATUSES:
+            rejects.add(ticket_id, error_msg or "Invalid ticket")
         print_status = f"Error: {error_msg or 'Invalid ticket'}"
-        log_checkin(log_path, ranger_id, ticket_id, print_status, attendee_name, attendee_company)
+        if checkin_future:
+            print_status += _settle_speculative_checkin(
+                checkin_future, status_code, ticket_id, base_url, api_key, event_id, trace
+            )
+        with span(trace, "log"):
+            log_checkin(log_path, ranger_id, ticket_id, print_status, attendee_name, attendee_company)
+        if trace:
+            trace.finish(print_status)
         if gui:
             gui.update_result(ticket_id, attendee_name or "—", attendee_company or "—", print_status, False)
         return
 
     # 2) Validate: we consider valid if Luma returned 200 and we got a name (or email)
-    # Already ensured in fetch_guest_by_ticket_id.
+    # Already ensured in fetch_guest_with_status.
+    # In cluster mode, claim the ticket now; another station may have got there first.
+    if sync:
+        prior = sync.claim_checkin(ticket_id, attendee_name, attendee_company)
+        if prior:
+            if checkin_future:
+                # The guest is checked in elsewhere already; the extra check-in changes nothing.
+                checkin_future.result()
+            _report_duplicate(prior, ranger_id, ticket_id, log_path, gui, trace)
+            return
 
-    # 3) Check in guest with Luma (if enabled)
+    # 3) Check in guest with Luma (if enabled; already in flight when pipelined)
     checkin_err = None
-    if luma.get("check_in_on_scan", True):
-        checkin_err = check_in_guest(ticket_id, base_url, api_key, event_id)
+    if check_in_on_scan and checkin_future is None:
+        checkin_err = _traced_check_in(trace, ticket_id, base_url, api_key, event_id)
 
     # 4) Print receipt
-    err = print_receipt(attendee_name, attendee_company, printer_name=printer_name, use_raw=use_raw)
+    with span(trace, "print"):
+        err = print_receipt(attendee_name, attendee_company, printer_name=printer_name, use_raw=use_raw)
+    if checkin_future:
+        with span(trace, "luma_checkin_wait"):
+            checkin_err = checkin_future.result()
     if err:
         print_status = f"Error: {err}"
+        if sync:
+            # No sticker: let the guest be rescanned here or at another station.
+            sync.release_checkin(ticket_id)
     else:
         print_status = "Success"
     if checkin_err:
         print_status = f"{print_status} (Luma check-in failed: {checkin_err})"
 
     # 5) Log
-    log_checkin(log_path, ranger_id, ticket_id, print_status, attendee_name, attendee_company)
+    with span(trace, "log"):
+        log_checkin(log_path, ranger_id, ticket_id, print_status, attendee_name, attendee_company)
+    if trace:
+        trace.finish(print_status)
 
     # 6) Update GUI
     if gui:
         gui.update_result(ticket_id, attendee_name, attendee_company, print_status, err is None)
 
 
+def _report_duplicate(
+    prior: dict,
+    ranger_id: str,
+    ticket_id: str,
+    log_path: str,
+    gui: Optional[CheckInGUI],
+    trace: Optional[ScanTrace],
+) -> None:
+    """Log and show a scan of a ticket that is already checked in (cluster mode)."""
+    attendee_name = prior.get("attendee_name") or ""
+    attendee_company = prior.get("attendee_company") or ""
+    print_status = f"Error: Already checked in at {prior.get('station_id') or '?'} ({prior.get('ts') or '?'})"
+    with span(trace, "log"):
+        log_checkin(log_path, ranger_id, ticket_id, print_status, attendee_name, attendee_company)
+    if trace:
+        trace.finish(print_status)
+    if gui:
+        gui.update_result(ticket_id, attendee_name or "—", attendee_company or "—", print_status, False)
+
+
 def worker_loop(
     scan_queue: queue.Queue,
     config: dict,
     gui: Optional[CheckInGUI],
+    traces: Optional[TraceBuffer] = None,
+    profiler: Optional[Profiler] = None,
+    sync: Optional[StationSync] = None,
+    rejects: Optional[RejectCache] = None,
+    roster: Optional[GuestStore] = None,
 ) -> None:
-    """Process scans from the queue one at a time (no merging)."""
+    """
+    Process scans from the queue one at a time (no merging).
+    Items are (ranger_id, ticket_id) or (ranger_id, ticket_id, ScanTrace); finished
+    traces go to traces, and scans run under profiler when a cProfile window is active.
+    """
     while True:
+        trace: Optional[ScanTrace] = None
         try:
             item = scan_queue.get()
             if item is None:
                 break
-            ranger_id, ticket_id = item
-            process_one_scan(ranger_id, ticket_id, config, gui)
-        except Exception:
-            pass
+            ranger_id, ticket_id = item[0], item[1]
+            trace = item[2] if len(item) > 2 else None
+            if trace:
+                trace.add_span("queue_wait", trace.started, time.perf_counter())
+            if profiler:
+                profiler.run(process_one_scan, ranger_id, ticket_id, config, gui, trace, sync, rejects, roster)
+            else:
+                process_one_scan(ranger_id, ticket_id, config, gui, trace, sync, rejects, roster)
+        except Exception as e:
+            # Keep the worker alive, but never lose the reason a scan failed.
+            traceback.print_exc()
+            if trace:
+                trace.finish("Error: unhandled exception", repr(e))
         finally:
+            if trace and traces is not None:
+                traces.add(trace)
             try:
                 scan_queue.task_done()
             except Exception:
@@ -96,21 +274,71 @@ def worker_loop(
 
 
 def main() -> None:
-    config = load_config()
+    parser = argparse.ArgumentParser(description="Ranger 2 + TPL 100 check-in app.")
+    parser.add_argument("--config", default=None, help="Path to config.yaml (default: next to main.py).")
+    parser.add_argument("--headless", action="store_true", help="Run without the desktop window (web page only).")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
     port = get_listen_port(config)
     scan_queue: queue.Queue = queue.Queue()
 
-    gui = CheckInGUI()
+    gui: Optional[CheckInGUI] = None if args.headless else CheckInGUI()
 
-    def on_scan(ranger_id: str, ticket_id: str) -> None:
-        scan_queue.put((ranger_id, ticket_id))
+    debug = get_debug_settings(config)
+    traces: Optional[TraceBuffer] = None
+    profiler: Optional[Profiler] = None
+    if debug.get("enabled", False):
+        traces = TraceBuffer(int(debug.get("trace_buffer_size", 500)))
+        profiler = Profiler()
 
-    _, server_thread = create_scan_server(port, on_scan)
+    rejects = RejectCache(ttl_s=float(get_luma_settings(config).get("reject_cache_ttl_s", 600)))
+
+    roster: Optional[GuestStore] = None
+    roster_path = (get_luma_settings(config).get("roster_snapshot") or "").strip()
+    if roster_path:
+        try:
+            roster = GuestStore.load(roster_path)
+            print(f"Roster snapshot: {len(roster)} ticket IDs from {roster_path}")
+        except (OSError, ValueError) as e:
+            print(f"Roster snapshot not loaded ({e}); looking up every guest in Luma")
+
+    def enqueue(ranger_id: str, ticket_id: str) -> None:
+        # Traces are only kept for /debug/traces; without it, scans go untraced.
+        if traces is not None:
+            scan_queue.put((ranger_id, ticket_id, ScanTrace(ranger_id, ticket_id)))
+        else:
+            scan_queue.put((ranger_id, ticket_id))
+
+    def on_scan(ranger_id: str, ticket_id: str) -> str:
+        # Raises InvalidTicketError for malformed or known-bad scans; nothing is queued.
+        ticket_id = validate_ticket_id(ticket_id, rejects)
+        enqueue(ranger_id, ticket_id)
+        return ticket_id
+
+    recorder = create_recorder(get_recording_settings(config).get("scan_trace_path"))
+
+    sync = create_station_sync(get_cluster_settings(config), port)
+    if sync:
+        log_path = (get_log_settings(config).get("checkin_log_path") or "checkins.csv").strip()
+        loaded = sync.seed_from_log(log_path)
+        sync.start()
+        print(f"Cluster mode: station {sync.station_id}, {len(sync.peers)} peer(s), {loaded} check-in(s) loaded from log")
+
+    _, server_thread = create_scan_server(
+        port,
+        on_scan,
+        recorder=recorder,
+        traces=traces,
+        profiler=profiler,
+        admin_token=(debug.get("admin_token") or "").strip(),
+        sync=sync,
+    )
     server_thread.start()
 
     worker = threading.Thread(
         target=worker_loop,
-        args=(scan_queue, config, gui),
+        args=(scan_queue, config, gui, traces, profiler, sync, rejects, roster),
         daemon=True,
     )
     worker.start()
@@ -128,6 +356,9 @@ def main() -> None:
             printer_name=printer_name,
             use_raw=use_raw,
         )
+        if sync and err is None and last.get("ticket_id"):
+            # The claim was withdrawn when the first print failed; the guest has a sticker now.
+            sync.claim_checkin(last["ticket_id"], last["attendee_name"], last["attendee_company"])
         if gui:
             gui.update_result(
                 last.get("ticket_id", ""),
@@ -137,11 +368,21 @@ def main() -> None:
                 err is None,
             )
 
-    gui.on_retry_print = retry_print
-    gui.on_manual_checkin = lambda ticket_id: scan_queue.put(("manual", (ticket_id or "").strip()))
+    def on_manual_checkin(ticket_id: str) -> None:
+        ticket_id = (ticket_id or "").strip()
+        if recorder:
+            recorder.record("manual", ticket_id, "manual", len(ticket_id.encode("utf-8")))
+        enqueue("manual", validate_ticket_id(ticket_id, rejects))
 
     print(f"Scan server listening on http://0.0.0.0:{port}/scan")
     print("Open this IP on the Ranger (e.g. http://192.168.55.82:8765) to load the check-in page and scan.")
+    if gui is None:
+        # Short joins keep Ctrl+C working on Windows.
+        while server_thread.is_alive():
+            server_thread.join(1.0)
+        return
+    gui.on_retry_print = retry_print
+    gui.on_manual_checkin = on_manual_checkin
     gui.run()
 
 
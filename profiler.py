@@ -0,0 +1,157 @@
+"""
+On-demand profiling of a running app, toggled from the debug endpoints.
+Two modes, each running for a fixed time window:
+  - "cprofile": cProfile around every scan the worker processes in the window.
+    Download is a .prof file (open with pstats or snakeviz).
+  - "sample": a background thread samples all thread stacks every few ms.
+    Download is collapsed-stack text (one "frame;frame;frame count" per line),
+    usable with flamegraph.pl or speedscope.
+"""
+
+import cProfile
+import io
+import marshal
+import ntpath
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Optional
+
+PROFILE_MODES = ("cprofile", "sample")
+MAX_PROFILE_SECONDS = 600
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    # ntpath.basename handles both "/" and "\\" separators.
+    return f"{code.co_name} ({ntpath.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profiler:
+    """One profiling window at a time; the last result stays available for download."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Held by the worker while a scan runs under cProfile, so stop() never
+        # collects stats from a profile that is still enabled.
+        self._run_lock = threading.Lock()
+        self._mode: Optional[str] = None
+        self._deadline = 0.0
+        self._profile: Optional[cProfile.Profile] = None
+        self._samples: Counter = Counter()
+        self._sample_count = 0
+        self._sampler: Optional[threading.Thread] = None
+        self._timer: Optional[threading.Timer] = None
+        self._result: Optional[tuple[str, bytes, str]] = None
+        self._result_summary = ""
+
+    def start(self, mode: str, seconds: float, interval_ms: float = 10.0) -> None:
+        """Start a profiling window. Raises ValueError on bad input or if one is already running."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; use one of {', '.join(PROFILE_MODES)}")
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+        with self._lock:
+            if self._mode is not None:
+                raise ValueError(f"A {self._mode} profile is already running")
+            self._mode = mode
+            self._deadline = time.monotonic() + seconds
+            if mode == "cprofile":
+                self._profile = cProfile.Profile()
+            else:
+                self._samples = Counter()
+                self._sample_count = 0
+                self._sampler = threading.Thread(
+                    target=self._sample_loop, args=(max(1.0, interval_ms) / 1000.0,), daemon=True
+                )
+                self._sampler.start()
+            self._timer = threading.Timer(seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self) -> bool:
+        """End the current window and keep its result. Returns False if nothing was running."""
+        with self._lock:
+            mode = self._mode
+            if mode is None:
+                return False
+            self._mode = None
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            sampler = self._sampler
+            self._sampler = None
+        if mode == "sample":
+            if sampler:
+                sampler.join()
+            self._result = ("profile.collapsed.txt", self._collapsed(), "text/plain; charset=utf-8")
+            self._result_summary = f"{self._sample_count} samples"
+        else:
+            with self._run_lock:
+                prof = self._profile
+                self._profile = None
+            if prof is not None:
+                prof.create_stats()
+                self._result = ("profile.prof", marshal.dumps(prof.stats), "application/octet-stream")
+                self._result_summary = self._top_functions(prof)
+        return True
+
+    def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call func; under cProfile if a cprofile window is active."""
+        if self._mode != "cprofile":
+            return func(*args, **kwargs)
+        with self._run_lock:
+            prof = self._profile
+            if prof is None:
+                return func(*args, **kwargs)
+            return prof.runcall(func, *args, **kwargs)
+
+    def status(self) -> dict:
+        with self._lock:
+            mode = self._mode
+            remaining = max(0.0, self._deadline - time.monotonic()) if mode else 0.0
+        return {
+            "running": mode is not None,
+            "mode": mode,
+            "remaining_s": round(remaining, 1),
+            "result": self._result[0] if self._result else None,
+            "summary": self._result_summary,
+        }
+
+    def result(self) -> Optional[tuple[str, bytes, str]]:
+        """(filename, data, mimetype) of the last finished window, or None."""
+        return self._result
+
+    def _sample_loop(self, interval: float) -> None:
+        me = threading.get_ident()
+        names = {}
+        while self._mode == "sample" and time.monotonic() < self._deadline:
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._samples[";".join(reversed(stack))] += 1
+            self._sample_count += 1
+            time.sleep(interval)
+
+    def _collapsed(self) -> bytes:
+        lines = [f"{stack} {count}" for stack, count in self._samples.most_common()]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _top_functions(prof: cProfile.Profile, limit: int = 15) -> str:
+        out = io.StringIO()
+        try:
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(limit)
+        except TypeError:
+            # No calls were profiled in the window.
+            return "no scans profiled"
+        return out.getvalue()
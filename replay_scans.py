@@ -0,0 +1,253 @@
+"""
+Replay a recorded scan trace (see scan_recorder.py) through the check-in pipeline
+against stubbed Luma and printer backends, and report latency and throughput.
+
+The stubs sleep for fixed, per-ticket deterministic latencies instead of calling
+Luma or the printer, so two builds replayed with the same trace and settings can
+be compared directly.
+
+Run:
+  python replay_scans.py scans.trace                       # original speed
+  python replay_scans.py scans.trace --speed 4             # 4x faster than recorded
+  python replay_scans.py scans.trace --speed 0 -o new.json # as fast as possible, save report
+  python replay_scans.py --compare old.json new.json       # diff two reports
+"""
+
+import argparse
+import json
+import queue
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import main as pipeline
+from config import load_config, _deep_merge
+from scan_recorder import read_trace
+from ticket_parser import InvalidTicketError, RejectCache, validate_ticket_id
+
+# Report fields compared by --compare, with the direction that counts as better.
+_COMPARE_FIELDS = [
+    ("throughput_per_s", "higher"),
+    ("latency_ms.p50", "lower"),
+    ("latency_ms.p90", "lower"),
+    ("latency_ms.p99", "lower"),
+    ("latency_ms.max", "lower"),
+    ("queue_wait_ms.p50", "lower"),
+    ("queue_wait_ms.p99", "lower"),
+    ("service_ms.p50", "lower"),
+    ("service_ms.p99", "lower"),
+]
+
+
+def _ticket_fraction(ticket_id: str, salt: str) -> float:
+    """Deterministic value in [0, 1) per ticket, so stubs behave the same on every run."""
+    return zlib.crc32(f"{salt}:{ticket_id}".encode("utf-8")) / 2**32
+
+
+def _stub_delay(base_ms: float, jitter: float, ticket_id: str, salt: str) -> None:
+    if base_ms <= 0:
+        return
+    factor = 1.0 + jitter * (2 * _ticket_fraction(ticket_id, salt) - 1)
+    time.sleep(max(0.0, base_ms * factor) / 1000.0)
+
+
+def install_stubs(luma_ms: float, checkin_ms: float, print_ms: float, jitter: float, invalid_pct: float) -> None:
+    """Replace the Luma and printer calls used by main.process_one_scan with local stubs."""
+
+    def fetch_guest_with_status(ticket_id, base_url, api_key, event_id=None):
+        _stub_delay(luma_ms, jitter, ticket_id, "get")
+        if _ticket_fraction(ticket_id, "valid") * 100 < invalid_pct:
+            return False, "", "", "Guest not found", 404
+        return True, f"Guest {ticket_id}", "Replay Co", None, 200
+
+    def check_in_guest(ticket_id, base_url, api_key, event_id=None, checked_in=True):
+        _stub_delay(checkin_ms, jitter, ticket_id, "checkin")
+        return None
+
+    def print_receipt(attendee_name, attendee_company, printer_name=None, use_raw=True):
+        _stub_delay(print_ms, jitter, attendee_name, "print")
+        return None
+
+    pipeline.fetch_guest_with_status = fetch_guest_with_status
+    pipeline.check_in_guest = check_in_guest
+    pipeline.print_receipt = print_receipt
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0, "mean": 0.0}
+    s = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(s[min(len(s) - 1, int(p * len(s)))], 2)
+
+    return {
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": round(s[-1], 2),
+        "mean": round(sum(s) / len(s), 2),
+    }
+
+
+def replay(trace_path: str, config: dict, speed: float, limit: Optional[int] = None) -> dict:
+    """
+    Feed the trace through ticket validation into a single worker running
+    main.process_one_scan, honouring the recorded inter-arrival times divided by
+    speed (speed <= 0: no waiting). Returns the latency/throughput report.
+    """
+    work: queue.Queue = queue.Queue()
+    rejects = RejectCache()
+    rejected = 0
+    queue_wait: list[float] = []
+    service: list[float] = []
+    latency: list[float] = []
+    max_depth = 0
+
+    def worker() -> None:
+        while True:
+            item = work.get()
+            if item is None:
+                break
+            ranger_id, ticket_id, enqueued = item
+            started = time.perf_counter()
+            try:
+                pipeline.process_one_scan(ranger_id, ticket_id, config, None, rejects=rejects)
+            except Exception as e:
+                print(f"Replay: scan {ticket_id!r} raised {e!r}", file=sys.stderr)
+            done = time.perf_counter()
+            queue_wait.append((started - enqueued) * 1000)
+            service.append((done - started) * 1000)
+            latency.append((done - enqueued) * 1000)
+
+    t = threading.Thread(target=worker, daemon=True)
+    t.start()
+
+    count = 0
+    t0 = time.perf_counter()
+    for offset, ranger_id, ticket_id, _shape, _size in read_trace(trace_path):
+        if limit is not None and count >= limit:
+            break
+        if speed > 0:
+            delay = t0 + offset / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        count += 1
+        try:
+            ticket_id = validate_ticket_id(ticket_id, rejects)
+        except InvalidTicketError:
+            rejected += 1
+            continue
+        work.put((ranger_id, ticket_id, time.perf_counter()))
+        max_depth = max(max_depth, work.qsize())
+    work.put(None)
+    t.join()
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "scans": count,
+        "rejected_before_queue": rejected,
+        "speed": speed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+        "max_queue_depth": max_depth,
+        "latency_ms": _percentiles(latency),
+        "queue_wait_ms": _percentiles(queue_wait),
+        "service_ms": _percentiles(service),
+    }
+
+
+def _field(report: dict, dotted: str) -> Optional[float]:
+    value = report
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare_reports(old: dict, new: dict) -> str:
+    """Table of old vs new values with relative change and a better/worse marker."""
+    lines = [f"{'metric':<22} {'old':>12} {'new':>12} {'change':>9}"]
+    for name, better in _COMPARE_FIELDS:
+        a, b = _field(old, name), _field(new, name)
+        if a is None or b is None:
+            continue
+        change = (b - a) / a * 100 if a else 0.0
+        mark = ""
+        if abs(change) >= 5:
+            improved = change > 0 if better == "higher" else change < 0
+            mark = "better" if improved else "WORSE"
+        lines.append(f"{name:<22} {a:>12} {b:>12} {change:>8.1f}% {mark}")
+    return "\n".join(lines)
+
+
+def format_report(r: dict) -> str:
+    lines = [
+        f"Scans: {r['scans']}  rejected before queue: {r.get('rejected_before_queue', 0)}",
+        f"Elapsed: {r['elapsed_s']} s  throughput: {r['throughput_per_s']} scans/s"
+        f"  max queue depth: {r['max_queue_depth']}",
+    ]
+    for key in ("latency_ms", "queue_wait_ms", "service_ms"):
+        p = r[key]
+        lines.append(
+            f"  {key:<14} p50 {p['p50']:>9}  p90 {p['p90']:>9}  p99 {p['p99']:>9}  max {p['max']:>9}  mean {p['mean']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded scan trace against stubbed backends.")
+    parser.add_argument("trace", nargs="?", help="Trace file written by scan recording.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor; 0 = as fast as possible (default 1).")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N scans.")
+    parser.add_argument("--luma-ms", type=float, default=150.0, help="Stub get-guest latency in ms (default 150).")
+    parser.add_argument("--checkin-ms", type=float, default=150.0, help="Stub check-in latency in ms (default 150).")
+    parser.add_argument("--print-ms", type=float, default=300.0, help="Stub print latency in ms (default 300).")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Per-ticket latency spread, 0..1 (default 0.2).")
+    parser.add_argument("--invalid-pct", type=float, default=0.0, help="Percentage of tickets the stub rejects.")
+    parser.add_argument("--config", default=None, help="config.yaml to replay with (default: the app's config).")
+    parser.add_argument("--label", default="", help="Free-text label stored in the report (e.g. build or commit).")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved reports and exit.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        print(compare_reports(old, new))
+        return 0
+    if not args.trace:
+        parser.error("trace file is required (or use --compare)")
+
+    install_stubs(args.luma_ms, args.checkin_ms, args.print_ms, args.jitter, args.invalid_pct)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Never touch the real audit log while replaying.
+        config = _deep_merge(load_config(args.config), {
+            "logging": {"checkin_log_path": str(Path(tmp) / "replay_checkins.csv")},
+        })
+        try:
+            report = replay(args.trace, config, args.speed, args.limit)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot replay {args.trace}: {e}", file=sys.stderr)
+            return 1
+    report["label"] = args.label
+    report["trace"] = args.trace
+    report["stubs"] = {
+        "luma_ms": args.luma_ms,
+        "checkin_ms": args.checkin_ms,
+        "print_ms": args.print_ms,
+        "jitter": args.jitter,
+        "invalid_pct": args.invalid_pct,
+    }
+    print(format_report(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
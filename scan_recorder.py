@@ -0,0 +1,118 @@
+"""
+Scan trace recording: writes every incoming scan to a compact JSON-lines file
+so an event's rush can be replayed later (see replay_scans.py).
+
+File format (one JSON value per line):
+  {"version": 1, "started_utc": "..."}          header
+  [offset_s, ranger_id, ticket_id, shape, size]  one line per scan
+offset_s is seconds since recording started; shape is how the payload arrived
+("json", "form", "raw" or "manual"); size is the payload length in bytes.
+The file is appended to: a restart adds a new header, and read_trace() shifts
+that session's offsets to follow the previous one.
+"""
+
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+TRACE_VERSION = 1
+
+
+class ScanRecorder:
+    """Append-only, thread-safe writer for scan trace files."""
+
+    def __init__(self, path: str):
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        # Line-buffered so a crash loses at most the scan being written.
+        self._f = open(p, "a", encoding="utf-8", buffering=1)
+        if self._f.tell() > 0 and not _ends_with_newline(p):
+            # The previous session died mid-line; keep its fragment off our header line.
+            self._f.write("\n")
+        header = {"version": TRACE_VERSION, "started_utc": datetime.utcnow().isoformat() + "Z"}
+        self._f.write(json.dumps(header) + "\n")
+
+    def record(self, ranger_id: str, ticket_id: str, shape: str, size: int = 0) -> None:
+        """Record one scan. Never raises: recording must not break check-in."""
+        offset = round(time.monotonic() - self._start, 4)
+        line = json.dumps([offset, ranger_id, ticket_id, shape, size], ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            try:
+                self._f.write(line + "\n")
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._f.close()
+            except Exception:
+                pass
+
+
+def _ends_with_newline(p: Path) -> bool:
+    with open(p, "rb") as f:
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+
+def read_trace(path: str) -> Iterator[tuple[float, str, str, str, int]]:
+    """
+    Yield (offset_s, ranger_id, ticket_id, shape, size) from a trace file, in order.
+    Sessions after a restart are shifted to follow the previous one.
+    A partly written last line of a session (the recorder was killed mid-write) is
+    skipped with a warning; an unreadable line anywhere else raises ValueError.
+    """
+    base = 0.0
+    last = 0.0
+    bad_line = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = None
+            if bad_line:
+                if not isinstance(item, dict):
+                    raise ValueError(f"{path}:{bad_line}: unreadable trace line")
+                _warn_incomplete(path, bad_line)
+                bad_line = 0
+            if item is None:
+                bad_line = lineno
+                continue
+            if isinstance(item, dict):
+                if item.get("version", TRACE_VERSION) > TRACE_VERSION:
+                    raise ValueError(f"Unsupported trace version: {item.get('version')}")
+                base = last
+                continue
+            try:
+                offset, ranger_id, ticket_id, shape, size = item
+                offset, size = float(offset), int(size)
+            except (TypeError, ValueError):
+                bad_line = lineno
+                continue
+            last = base + offset
+            yield last, ranger_id, ticket_id, shape, size
+    if bad_line:
+        _warn_incomplete(path, bad_line)
+
+
+def _warn_incomplete(path: str, lineno: int) -> None:
+    print(f"Warning: {path}:{lineno}: skipped incomplete trace line (recording was interrupted)", file=sys.stderr)
+
+
+def create_recorder(path: Optional[str]) -> Optional[ScanRecorder]:
+    """Return a recorder for path, or None when recording is disabled (empty path)."""
+    path = (path or "").strip()
+    if not path:
+        return None
+    return ScanRecorder(path)
@@ -5,13 +5,20 @@ This server listens on a configurable port and enqueues each scan for processing
 so that multiple scans are handled in real-time without merging data from different Rangers.
 """
 
+import hmac
 import threading
-from typing import Callable
+from typing import Callable, Optional
 
 from html import escape as _h
 from urllib.parse import quote
 
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, request, jsonify, redirect, Response
+
+from profiler import Profiler
+from scan_recorder import ScanRecorder
+from station_sync import StationSync
+from ticket_parser import InvalidTicketError
+from tracing import TraceBuffer
 
 _PAGE_HTML = """<!DOCTYPE html>
 <html lang="en">
@@ -52,12 +59,23 @@ _PAGE_HTML = """<!DOCTYPE html>
 
 def create_scan_server(
     port: int,
-    on_scan: Callable[[str, str], None],
+    on_scan: Callable[[str, str], Optional[str]],
+    recorder: Optional[ScanRecorder] = None,
+    traces: Optional[TraceBuffer] = None,
+    profiler: Optional[Profiler] = None,
+    admin_token: str = "",
+    sync: Optional[StationSync] = None,
 ) -> tuple[Flask, threading.Thread]:
     """
     Create a Flask app that accepts POST with ticket_id (and optional ranger_id),
     and a background thread running the server.
     on_scan(ranger_id, ticket_id) is called for each scan; implement thread-safe handling inside.
+    It may return the normalised ticket ID that was queued; responses show that instead of the raw scan.
+    If on_scan raises InvalidTicketError the scan is answered as a client error (400).
+    recorder: optional; every scan received is written to its trace file before on_scan.
+    traces / profiler: optional; enable the /debug endpoints (protected by admin_token if set;
+    /debug/profile is refused unless admin_token is set).
+    sync: optional; enables the /sync endpoints used by peer stations in cluster mode.
     """
     app = Flask(__name__)
 
@@ -84,6 +102,7 @@ def create_scan_server(
         # or form: ticket_id=...&ranger_id=... (e.g. from the web page text field)
         ticket_id = ""
         ranger_id = ""
+        shape = "json" if request.is_json else "form"
         is_form = not request.is_json and request.content_type and "application/x-www-form-urlencoded" in (request.content_type or "")
         if request.is_json:
             data = request.get_json(silent=True) or {}
@@ -95,14 +114,21 @@ def create_scan_server(
         # Some scanners send raw body as the barcode
         if not ticket_id and request.get_data(as_text=True):
             ticket_id = request.get_data(as_text=True).strip()
+            shape = "raw"
         if not ticket_id:
             if is_form:
                 return redirect("/?error=" + quote("Missing ticket ID"))
             return jsonify({"ok": False, "error": "Missing ticket_id"}), 400
         if not ranger_id:
             ranger_id = "web"
+        if recorder:
+            recorder.record(ranger_id, ticket_id, shape, request.content_length or 0)
         try:
-            on_scan(ranger_id, ticket_id)
+            ticket_id = on_scan(ranger_id, ticket_id) or ticket_id
+        except InvalidTicketError as e:
+            if is_form:
+                return redirect("/?error=" + quote(str(e)))
+            return jsonify({"ok": False, "error": str(e), "ticket_id": ticket_id}), 400
         except Exception as e:
             if is_form:
                 return redirect("/?error=" + quote(str(e)))
@@ -115,6 +141,119 @@ def create_scan_server(
     def health():
         return jsonify({"status": "ok"}), 200
 
+    def _debug_denied():
+        if not admin_token:
+            return None
+        given = request.headers.get("X-Admin-Token") or request.args.get("token") or ""
+        if hmac.compare_digest(given.encode("utf-8"), admin_token.encode("utf-8")):
+            return None
+        return jsonify({"ok": False, "error": "Invalid or missing admin token"}), 403
+
+    def _profile_denied():
+        # Profiling slows the station down, so it is never open to the whole LAN.
+        if not admin_token:
+            return jsonify({"ok": False, "error": "Profiling requires debug.admin_token to be set"}), 403
+        return _debug_denied()
+
+    def _int_arg(name: str, default: int) -> int:
+        try:
+            return int(request.args.get(name, default))
+        except (TypeError, ValueError):
+            return default
+
+    if traces is not None:
+        @app.route("/debug/traces", methods=["GET"])
+        def debug_traces():
+            denied = _debug_denied()
+            if denied:
+                return denied
+            # ?slowest=N (default) or ?recent=N
+            if "recent" in request.args:
+                items = traces.recent(_int_arg("recent", 20))
+            else:
+                items = traces.slowest(_int_arg("slowest", 20))
+            return jsonify({"ok": True, "buffered": len(traces), "traces": items}), 200
+
+    if profiler is not None:
+        @app.route("/debug/profile", methods=["GET"])
+        def debug_profile_status():
+            denied = _profile_denied()
+            if denied:
+                return denied
+            return jsonify({"ok": True, **profiler.status()}), 200
+
+        @app.route("/debug/profile/start", methods=["POST"])
+        def debug_profile_start():
+            denied = _profile_denied()
+            if denied:
+                return denied
+            mode = request.args.get("mode", "sample")
+            try:
+                seconds = float(request.args.get("seconds", 30))
+                interval_ms = float(request.args.get("interval_ms", 10))
+                profiler.start(mode, seconds, interval_ms)
+            except ValueError as e:
+                return jsonify({"ok": False, "error": str(e)}), 400
+            return jsonify({"ok": True, **profiler.status()}), 202
+
+        @app.route("/debug/profile/stop", methods=["POST"])
+        def debug_profile_stop():
+            denied = _profile_denied()
+            if denied:
+                return denied
+            stopped = profiler.stop()
+            return jsonify({"ok": True, "stopped": stopped, **profiler.status()}), 200
+
+        @app.route("/debug/profile/download", methods=["GET"])
+        def debug_profile_download():
+            denied = _profile_denied()
+            if denied:
+                return denied
+            result = profiler.result()
+            if result is None:
+                return jsonify({"ok": False, "error": "No finished profile yet"}), 404
+            filename, data, mimetype = result
+            return Response(
+                data,
+                mimetype=mimetype,
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            )
+
+    if sync is not None:
+        def _sync_denied():
+            if not sync.token:
+                return None
+            given = request.headers.get("X-Cluster-Token") or ""
+            if hmac.compare_digest(given.encode("utf-8"), sync.token.encode("utf-8")):
+                return None
+            return jsonify({"ok": False, "error": "Invalid or missing cluster token"}), 403
+
+        @app.route("/sync/push", methods=["POST"])
+        def sync_push():
+            denied = _sync_denied()
+            if denied:
+                return denied
+            data = request.get_json(silent=True) or {}
+            records = data.get("records")
+            if not isinstance(records, list):
+                return jsonify({"ok": False, "error": "Missing records"}), 400
+            applied = sync.apply_remote([r for r in records if isinstance(r, dict)])
+            return jsonify({"ok": True, "applied": applied}), 200
+
+        @app.route("/sync/records", methods=["GET"])
+        def sync_records():
+            denied = _sync_denied()
+            if denied:
+                return denied
+            return jsonify(sync.records_since(_int_arg("since", 0))), 200
+
+        @app.route("/sync/status", methods=["GET"])
+        def sync_status():
+            denied = _sync_denied()
+            if denied:
+                return denied
+            return jsonify(sync.status()), 200
+
     def run_server():
         app.run(host="0.0.0.0", port=port, threaded=True, use_reloader=False)
 
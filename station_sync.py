@@ -0,0 +1,342 @@
+"""
+Multi-station cluster mode: stations (laptops running main.py) on the same LAN
+replicate their checked-in tickets and guest roster cache to each other over HTTP,
+so a guest checked in at one entrance is answered locally as a duplicate at every
+other entrance without a Luma call, and a guest looked up in Luma at one station
+is not looked up again at another.
+
+Replication is full-mesh and leaderless. Every station keeps an append-only log of
+the records it created itself (sequence numbers 0, 1, 2, ...):
+  - push: each new record is POSTed to all peers' /sync/push right away (low latency);
+  - pull: every few seconds each peer's /sync/records?since=N is polled, which
+    catches up after a peer was offline or a push was lost.
+Each station configures the full peer list. Two stations checking in the same
+ticket at the same moment can both succeed; the copy with the earlier timestamp
+wins everywhere and the collision is counted in /sync/status.
+"""
+
+import csv
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from guest_store import GuestStore
+
+# HTTP timeouts for peer calls; peers are on the LAN, so fail fast and let pull catch up.
+PUSH_TIMEOUT_S = 1.0
+PULL_TIMEOUT_S = 3.0
+
+
+def _now_utc() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class StationSync:
+    """
+    Replicated state for one station: checked-in tickets and known guests.
+    Records are dicts: {"kind": "checkin"|"release"|"guest", "ticket_id", "station_id", "ts",
+    "attendee_name", "attendee_company", "epoch", "seq"}; seq counts from 0 in each epoch.
+    """
+
+    def __init__(
+        self,
+        station_id: str,
+        peers: list[str],
+        token: str = "",
+        pull_interval_s: float = 2.0,
+    ):
+        self.station_id = station_id
+        # Changes on every start, so peers notice our log was rebuilt and pull it again.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.peers = [p.rstrip("/") for p in peers if p and p.strip()]
+        self.token = token
+        self.pull_interval_s = pull_interval_s
+        self._lock = threading.Lock()
+        self._log: list[dict] = []
+        self._checked_in: dict[str, dict] = {}
+        # Roster cache in compact form; large events replicate tens of thousands of guests.
+        self._guests = GuestStore()
+        self._peer_pos: dict[str, tuple[str, int]] = {}
+        self._peer_ok: dict[str, Optional[str]] = {}
+        self._conflicts: set[str] = set()
+        # One queue and sender thread per peer, so a slow or offline peer does not delay the others.
+        self._push_queues: dict[str, queue.Queue] = {p: queue.Queue() for p in self.peers}
+        self._started = False
+
+    # --- local API used by process_one_scan -----------------------------------
+
+    def checked_in(self, ticket_id: str) -> Optional[dict]:
+        """The check-in record for ticket_id from any station, or None."""
+        with self._lock:
+            return self._checked_in.get(ticket_id)
+
+    def guest(self, ticket_id: str) -> Optional[tuple[str, str]]:
+        """(attendee_name, attendee_company) if any station has looked this guest up."""
+        with self._lock:
+            record = self._guests.get(ticket_id)
+        return (record.attendee_name, record.attendee_company) if record else None
+
+    def remember_guest(self, ticket_id: str, attendee_name: str, attendee_company: str) -> None:
+        """Add a looked-up guest to the roster cache and replicate it."""
+        with self._lock:
+            known = self._guests.get(ticket_id)
+            if known and (known.attendee_name, known.attendee_company) == (attendee_name, attendee_company):
+                return
+            self._guests.add(ticket_id, attendee_name, attendee_company)
+            record = self._append_local("guest", ticket_id, attendee_name, attendee_company)
+        self._push(record)
+
+    def claim_checkin(self, ticket_id: str, attendee_name: str, attendee_company: str) -> Optional[dict]:
+        """
+        Mark ticket_id as checked in at this station and replicate it.
+        Returns None if the claim succeeded, or the existing record if the ticket
+        was already checked in (here or at another station).
+        """
+        with self._lock:
+            existing = self._checked_in.get(ticket_id)
+            if existing:
+                return existing
+            record = self._append_local("checkin", ticket_id, attendee_name, attendee_company)
+            self._checked_in[ticket_id] = record
+            if ticket_id not in self._guests:
+                self._guests.add(ticket_id, attendee_name, attendee_company)
+        self._push(record)
+        return None
+
+    def release_checkin(self, ticket_id: str) -> None:
+        """
+        Withdraw this station's claim on ticket_id (the sticker did not print), so the
+        guest can be scanned again at any station. Claims of other stations are kept.
+        """
+        with self._lock:
+            existing = self._checked_in.get(ticket_id)
+            if not existing or existing["station_id"] != self.station_id:
+                return
+            del self._checked_in[ticket_id]
+            record = self._append_local("release", ticket_id, existing["attendee_name"], existing["attendee_company"])
+        self._push(record)
+
+    def seed_from_log(self, log_path: str) -> int:
+        """
+        Rebuild this station's own check-ins from its audit log (checkin_logger CSV),
+        so a restart does not forget who was already checked in. Returns records loaded.
+        """
+        p = Path(log_path)
+        if not p.exists():
+            return 0
+        loaded = 0
+        with open(p, "r", newline="", encoding="utf-8", errors="replace") as f:
+            for row in csv.reader(f):
+                if len(row) < 4 or row[0] == "timestamp_utc" or not row[3].startswith("Success"):
+                    continue
+                ticket_id = row[2].strip()
+                name = row[4] if len(row) > 4 else ""
+                company = row[5] if len(row) > 5 else ""
+                with self._lock:
+                    if ticket_id in self._checked_in:
+                        continue
+                    record = self._append_local("checkin", ticket_id, name, company, ts=row[0])
+                    self._checked_in[ticket_id] = record
+                    if ticket_id not in self._guests:
+                        self._guests.add(ticket_id, name, company)
+                loaded += 1
+        return loaded
+
+    # --- replication -----------------------------------------------------------
+
+    def records_since(self, since: int, limit: int = 1000) -> dict:
+        """Own records with seq >= since (served at /sync/records)."""
+        with self._lock:
+            records = self._log[max(0, since):max(0, since) + limit]
+            total = len(self._log)
+        return {
+            "station_id": self.station_id,
+            "epoch": self.epoch,
+            "records": records,
+            "next": max(0, since) + len(records),
+            "total": total,
+        }
+
+    def apply_remote(self, records: list[dict]) -> int:
+        """Merge records created by other stations. Returns how many changed local state."""
+        applied = 0
+        with self._lock:
+            for r in records:
+                ticket_id = (r.get("ticket_id") or "").strip()
+                station = r.get("station_id") or ""
+                if not ticket_id or station == self.station_id:
+                    continue
+                name = r.get("attendee_name") or ""
+                company = r.get("attendee_company") or ""
+                if r.get("kind") == "guest":
+                    if ticket_id not in self._guests:
+                        self._guests.add(ticket_id, name, company)
+                        applied += 1
+                    continue
+                if r.get("kind") == "release":
+                    existing = self._checked_in.get(ticket_id)
+                    if existing and existing["station_id"] == station and self._claim_precedes(existing, r):
+                        del self._checked_in[ticket_id]
+                        applied += 1
+                    continue
+                if r.get("kind") != "checkin":
+                    continue
+                if ticket_id not in self._guests:
+                    self._guests.add(ticket_id, name, company)
+                existing = self._checked_in.get(ticket_id)
+                if existing is None:
+                    self._checked_in[ticket_id] = dict(r)
+                    applied += 1
+                elif existing["station_id"] != station:
+                    # Same guest checked in at two stations before replication caught up.
+                    if (r.get("ts") or "", station) < (existing.get("ts") or "", existing["station_id"]):
+                        self._checked_in[ticket_id] = dict(r)
+                        applied += 1
+                    self._conflicts.add(ticket_id)
+        return applied
+
+    @staticmethod
+    def _claim_precedes(claim: dict, release: dict) -> bool:
+        """
+        Whether claim was made before release (both from the same station). seq only
+        orders records within one epoch; records can arrive twice (push and pull), so a
+        re-claim after the release must survive. A claim from another epoch predates
+        the station's restart and is always stale.
+        """
+        if claim.get("epoch") != release.get("epoch"):
+            return True
+        return int(claim.get("seq", -1)) < int(release.get("seq", -1))
+
+    def _reset_station(self, station_id: str, epoch: str) -> int:
+        """Forget check-ins of station_id from epochs other than epoch (it restarted). Returns count."""
+        with self._lock:
+            stale = [
+                t for t, r in self._checked_in.items()
+                if r.get("station_id") == station_id and r.get("epoch") != epoch
+            ]
+            for ticket_id in stale:
+                del self._checked_in[ticket_id]
+        return len(stale)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "station_id": self.station_id,
+                "epoch": self.epoch,
+                "checked_in": len(self._checked_in),
+                "guests": len(self._guests),
+                "own_records": len(self._log),
+                "conflicts": len(self._conflicts),
+                "peers": {
+                    peer: {"position": self._peer_pos.get(peer, ("", 0))[1], "error": self._peer_ok.get(peer)}
+                    for peer in self.peers
+                },
+            }
+
+    def start(self) -> None:
+        """Start the push and pull background threads (no-op without peers)."""
+        if self._started or not self.peers:
+            return
+        self._started = True
+        for peer in self.peers:
+            threading.Thread(target=self._push_loop, args=(peer,), name=f"sync-push {peer}", daemon=True).start()
+        threading.Thread(target=self._pull_loop, name="sync-pull", daemon=True).start()
+
+    def _append_local(self, kind: str, ticket_id: str, name: str, company: str, ts: str = "") -> dict:
+        """Append to the own-origin log. Caller holds self._lock."""
+        record = {
+            "kind": kind,
+            "ticket_id": ticket_id,
+            "station_id": self.station_id,
+            "ts": ts or _now_utc(),
+            "attendee_name": name,
+            "attendee_company": company,
+            "epoch": self.epoch,
+            "seq": len(self._log),
+        }
+        self._log.append(record)
+        return record
+
+    def _headers(self) -> dict:
+        return {"X-Cluster-Token": self.token} if self.token else {}
+
+    def _push(self, record: dict) -> None:
+        if self._started:
+            for q in self._push_queues.values():
+                q.put(record)
+
+    def _push_loop(self, peer: str) -> None:
+        session = requests.Session()
+        q = self._push_queues[peer]
+        while True:
+            batch = [q.get()]
+            # Send whatever else is already waiting in the same request.
+            while len(batch) < 100:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            body = {"station_id": self.station_id, "epoch": self.epoch, "records": batch}
+            try:
+                session.post(f"{peer}/sync/push", json=body, headers=self._headers(), timeout=PUSH_TIMEOUT_S)
+            except requests.RequestException:
+                # The peer's next pull from us picks these records up.
+                pass
+
+    def _pull_loop(self) -> None:
+        session = requests.Session()
+        while True:
+            for peer in self.peers:
+                self._pull_peer(session, peer)
+            time.sleep(self.pull_interval_s)
+
+    def _pull_peer(self, session: requests.Session, peer: str) -> None:
+        epoch, since = self._peer_pos.get(peer, ("", 0))
+        while True:
+            try:
+                r = session.get(
+                    f"{peer}/sync/records",
+                    params={"since": since},
+                    headers=self._headers(),
+                    timeout=PULL_TIMEOUT_S,
+                )
+                r.raise_for_status()
+                data = r.json()
+            except (requests.RequestException, ValueError) as e:
+                self._peer_ok[peer] = str(e)
+                return
+            if data.get("epoch") != epoch:
+                # Peer restarted (or first contact): its log was rebuilt. Drop what we hold
+                # from its earlier runs (claims it no longer has, e.g. failed prints) and
+                # read the new log from the start.
+                epoch = data.get("epoch", "")
+                self._reset_station(data.get("station_id") or "", epoch)
+                if since != 0:
+                    since = 0
+                    continue
+            self.apply_remote(data.get("records") or [])
+            since = int(data.get("next", since))
+            self._peer_pos[peer] = (epoch, since)
+            self._peer_ok[peer] = None
+            if since >= int(data.get("total", since)):
+                return
+
+
+def create_station_sync(cluster: dict, port: int) -> Optional[StationSync]:
+    """Build StationSync from the config "cluster" section, or None when cluster mode is off."""
+    if not cluster.get("enabled"):
+        return None
+    station_id = (cluster.get("station_id") or "").strip() or f"{socket.gethostname()}:{port}"
+    return StationSync(
+        station_id=station_id,
+        peers=list(cluster.get("peers") or []),
+        token=(cluster.get("token") or "").strip(),
+        pull_interval_s=float(cluster.get("pull_interval_s", 2.0)),
+    )
@@ -0,0 +1,140 @@
+"""
+Ticket ID parsing and validation, run on every scan before it is queued.
+Scanners type whatever they read: full Luma check-in URLs, stray whitespace,
+characters mangled by a wrong keyboard layout, or half a code. Anything that
+cannot be a guest/ticket key is rejected here, immediately, instead of costing
+a Luma API call. Tickets Luma has already reported as unknown are remembered in
+a RejectCache so repeated bad scans never reach Luma either.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Guest key prefixes as used in Luma QR codes (lower-case after normalisation).
+GUEST_PREFIXES = ("g-", "gst-")
+# Other Luma IDs people scan by mistake (e.g. an event poster QR code).
+NON_GUEST_PREFIXES = {"evt-": "an event", "cal-": "a calendar", "usr-": "a user profile"}
+# Query parameters that may carry the guest key in a URL-form QR code.
+URL_KEY_PARAMS = ("pk", "guest_key", "ticket_key", "id")
+
+MIN_KEY_LENGTH = 6
+MAX_KEY_LENGTH = 64
+_KEY_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+# Control and zero-width characters some scanners prepend or append.
+_JUNK_RE = re.compile(r"[\x00-\x1f\x7f\u200b-\u200f\u2060\ufeff]")
+
+
+class InvalidTicketError(ValueError):
+    """Raised for scans rejected before processing; the message is shown to the user."""
+
+
+def _key_from_url(text: str) -> tuple[str | None, str | None]:
+    """Extract the guest key from a URL-form QR code. Returns (key, error)."""
+    if "://" not in text:
+        text = "https://" + text
+    try:
+        parts = urlsplit(text)
+    except ValueError:
+        return None, "Unreadable URL in scan"
+    params = parse_qs(parts.query)
+    for name in URL_KEY_PARAMS:
+        values = params.get(name)
+        if values and values[0].strip():
+            return values[0].strip(), None
+    for segment in reversed([s for s in parts.path.split("/") if s]):
+        if segment.lower().startswith(GUEST_PREFIXES):
+            return segment, None
+    return None, "QR code URL does not contain a guest key"
+
+
+def _looks_like_url(text: str) -> bool:
+    lower = text.lower()
+    return "://" in lower or lower.startswith(("lu.ma/", "luma.com/", "www.")) or ("/" in text and "?" in text)
+
+
+def parse_ticket_id(raw: str) -> tuple[str | None, str | None]:
+    """
+    Normalise a scanned value to the guest/ticket key sent to Luma.
+    Returns (ticket_id, None) on success or (None, error_message) if the scan is malformed.
+    """
+    text = unicodedata.normalize("NFKC", raw or "")
+    text = _JUNK_RE.sub("", text).strip()
+    if not text:
+        return None, "Empty scan"
+
+    if _looks_like_url(text):
+        key, err = _key_from_url(text)
+        if err:
+            return None, err
+        text = key or ""
+
+    lower = text.lower()
+    for prefix, what in NON_GUEST_PREFIXES.items():
+        if lower.startswith(prefix):
+            return None, f"This is {what} code, not a guest ticket"
+    for prefix in GUEST_PREFIXES:
+        if lower.startswith(prefix):
+            text = prefix + text[len(prefix):]
+            if len(text) - len(prefix) < MIN_KEY_LENGTH - 2:
+                return None, "Incomplete ticket code (partial scan?)"
+            break
+
+    if not _KEY_RE.match(text):
+        return None, "Unreadable ticket code (check the scanner keyboard layout)"
+    if len(text) < MIN_KEY_LENGTH:
+        return None, "Incomplete ticket code (partial scan?)"
+    if len(text) > MAX_KEY_LENGTH:
+        return None, "Ticket code too long (two codes scanned at once?)"
+    return text, None
+
+
+class RejectCache:
+    """Thread-safe LRU of ticket IDs known to be invalid, with expiry."""
+
+    def __init__(self, max_size: int = 10000, ttl_s: float = 600.0):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def add(self, ticket_id: str, reason: str) -> None:
+        if self.ttl_s <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[ticket_id] = (time.monotonic() + self.ttl_s, reason)
+            self._items.move_to_end(ticket_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def get(self, ticket_id: str) -> Optional[str]:
+        """The cached rejection reason, or None if unknown or expired."""
+        with self._lock:
+            item = self._items.get(ticket_id)
+            if item is None:
+                return None
+            expires, reason = item
+            if expires < time.monotonic():
+                del self._items[ticket_id]
+                return None
+            self._items.move_to_end(ticket_id)
+            return reason
+
+
+def validate_ticket_id(raw: str, rejects: Optional[RejectCache] = None) -> str:
+    """
+    parse_ticket_id plus the reject cache, for use in front of the scan queue.
+    Returns the normalised ticket ID or raises InvalidTicketError.
+    """
+    ticket_id, err = parse_ticket_id(raw)
+    if err or not ticket_id:
+        raise InvalidTicketError(err or "Invalid ticket code")
+    if rejects is not None:
+        reason = rejects.get(ticket_id)
+        if reason:
+            raise InvalidTicketError(f"{reason} (already checked with Luma)")
+    return ticket_id
@@ -0,0 +1,114 @@
+"""
+Per-scan tracing: each scan carries a ScanTrace from the /scan handler through
+queue wait, Luma lookup, check-in, print and log. Finished traces are kept in a
+fixed-size ring buffer (TraceBuffer) that the debug endpoints can query,
+e.g. GET /debug/traces?slowest=10.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import ContextManager, Iterator, Optional
+
+
+class ScanTrace:
+    """Timing record for one scan; spans are (name, start offset, duration, error)."""
+
+    def __init__(self, ranger_id: str, ticket_id: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.ranger_id = ranger_id
+        self.ticket_id = ticket_id
+        self.started_utc = datetime.utcnow().isoformat() + "Z"
+        self.status = ""
+        self.error: Optional[str] = None
+        self._t0 = time.perf_counter()
+        self._end: Optional[float] = None
+        self._lock = threading.Lock()
+        self._spans: list[tuple[str, float, float, Optional[str]]] = []
+
+    def add_span(self, name: str, start: float, end: float, error: Optional[str] = None) -> None:
+        """Add a span from two time.perf_counter() values. Safe to call from any thread."""
+        with self._lock:
+            self._spans.append((name, start - self._t0, end - start, error))
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block; an exception is recorded on the span and re-raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.add_span(name, start, time.perf_counter(), repr(e))
+            raise
+        self.add_span(name, start, time.perf_counter())
+
+    def finish(self, status: str = "", error: Optional[str] = None) -> None:
+        self._end = time.perf_counter()
+        if status:
+            self.status = status
+        if error:
+            self.error = error
+
+    @property
+    def started(self) -> float:
+        """perf_counter() value when the trace was created (used for queue wait)."""
+        return self._t0
+
+    @property
+    def duration_ms(self) -> float:
+        end = self._end if self._end is not None else time.perf_counter()
+        return (end - self._t0) * 1000
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self._spans, key=lambda s: s[1])
+        return {
+            "trace_id": self.trace_id,
+            "ranger_id": self.ranger_id,
+            "ticket_id": self.ticket_id,
+            "started_utc": self.started_utc,
+            "duration_ms": round(self.duration_ms, 2),
+            "status": self.status,
+            "error": self.error,
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 2), "duration_ms": round(dur * 1000, 2), "error": err}
+                for name, start, dur, err in spans
+            ],
+        }
+
+
+def span(trace: Optional[ScanTrace], name: str) -> ContextManager:
+    """trace.span(name), or a no-op when the scan is not traced."""
+    if trace is None:
+        return nullcontext()
+    return trace.span(name)
+
+
+class TraceBuffer:
+    """Thread-safe ring buffer of the most recent finished traces."""
+
+    def __init__(self, size: int = 500):
+        self._lock = threading.Lock()
+        self._traces: deque[ScanTrace] = deque(maxlen=max(1, size))
+
+    def add(self, trace: ScanTrace) -> None:
+        with self._lock:
+            self._traces.append(trace)
+
+    def slowest(self, n: int) -> list[dict]:
+        with self._lock:
+            traces = list(self._traces)
+        traces.sort(key=lambda t: t.duration_ms, reverse=True)
+        return [t.to_dict() for t in traces[:max(0, n)]]
+
+    def recent(self, n: int) -> list[dict]:
+        with self._lock:
+            traces = list(self._traces)[-max(0, n):] if n > 0 else []
+        return [t.to_dict() for t in reversed(traces)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._traces)